@@ -2,12 +2,12 @@ import streamlit as st
 import gspread
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib.patches as mpatches  # For legend handles
+import altair as alt
 from oauth2client.service_account import ServiceAccountCredentials
-import google.generativeai as genai
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # --------------------------
 #  1) LOAD SECRETS
@@ -17,45 +17,222 @@ import json
 
 scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 
-# Load the ENTIRE JSON from your service account (as text) in Streamlit Secrets,
-# then parse it with json.loads:
-service_account_info = json.loads(st.secrets["GCP_SERVICE_ACCOUNT"])
-credentials = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
-gc = gspread.authorize(credentials)
 
-# Gemini/Generative AI Setup
-gemini_api_key = st.secrets["GEMINI_API_KEY"]
-genai.configure(api_key=gemini_api_key)
+# The authorized client is cached as a resource so reruns don't re-authorize.
+@st.cache_resource(show_spinner=False)
+def get_client():
+    # Load the ENTIRE JSON from your service account (as text) in Streamlit Secrets,
+    # then parse it with json.loads:
+    service_account_info = json.loads(st.secrets["GCP_SERVICE_ACCOUNT"])
+    credentials = ServiceAccountCredentials.from_json_keyfile_dict(service_account_info, scope)
+    return gspread.authorize(credentials)
 
 
 # --------------------------
 #  2) SET UP GOOGLE SHEET
 # --------------------------
 SHEET_NAME = "wine_ratings"  # Change if needed
-sheet = gc.open(SHEET_NAME).sheet1
 
-# Ensure headers exist
-headers = sheet.row_values(1)
-expected_headers = ["Name", "Wine", "Rating", "Category", "Taste"]
-if headers != expected_headers:
-    sheet.insert_row(expected_headers, 1)
+# Ratings and tasting notes live in separate worksheets so the Rating
+# column is purely numeric and each view only reads the rows it needs.
+worksheet_headers = {
+    "ratings": ["Name", "Wine", "Rating"],
+    "tastes": ["Name", "Wine", "Taste"],
+}
+
+# Older versions of the app kept everything in the first worksheet
+legacy_headers = ["Name", "Wine", "Rating", "Category", "Taste"]
+legacy_categories = {"ratings": "Rating", "tastes": "Taste"}
+
+
+@st.cache_resource(show_spinner=False)
+def get_spreadsheet():
+    return get_client().open(SHEET_NAME)
+
+
+def _legacy_rows(spreadsheet, title):
+    """Rows for `title` from the old single-sheet layout in sheet1, if it's still there."""
+    # Unformatted values keep legacy ratings numeric, formatted date/time strings keep
+    # date-like names and notes as text, and RAW writes every cell back as-is
+    legacy = spreadsheet.sheet1.get_all_values(
+        value_render_option="UNFORMATTED_VALUE", date_time_render_option="FORMATTED_STRING"
+    )
+    if not legacy or legacy[0] != legacy_headers:
+        return []
+    cols = [legacy_headers.index(h) for h in worksheet_headers[title]]
+    category = legacy_headers.index("Category")
+    return [
+        [row[i] for i in cols]
+        for row in legacy[1:]
+        if row[category] == legacy_categories[title]
+    ]
+
+
+@st.cache_resource(show_spinner=False)
+def get_worksheet(title):
+    """Opens (or creates) one of the worksheets in `worksheet_headers`, once per process."""
+    spreadsheet = get_spreadsheet()
+    headers = worksheet_headers[title]
+    try:
+        ws = spreadsheet.worksheet(title)
+    except gspread.WorksheetNotFound:
+        # Read the legacy rows before creating anything, so a failed read can't leave an empty sheet
+        rows = [headers] + _legacy_rows(spreadsheet, title)
+        ws = spreadsheet.add_worksheet(title=title, rows=max(len(rows), 1000), cols=len(headers))
+        ws.append_rows(rows, value_input_option="RAW")
+        return ws
+
+    # Ensure headers exist
+    if ws.row_values(1) != headers:
+        ws.insert_row(headers, 1)
+
+    # A migration that failed after creating the sheet leaves at most the header row;
+    # copy the legacy rows again in that case
+    if not ws.get("A2"):
+        rows = _legacy_rows(spreadsheet, title)
+        if rows:
+            ws.append_rows(rows, value_input_option="RAW")
+    return ws
+
+
+# Last successful read of each worksheet, used to answer the first view after a cold start
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots")
+
+
+def _snapshot_path(title):
+    return os.path.join(SNAPSHOT_DIR, f"{title}.pkl")
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_worksheet(title):
+    """Reads all rows from a worksheet. Cached so widget reruns don't hit the Sheets API.
+
+    Returns the DataFrame along with the sorted user and wine lists for the selectboxes.
+    """
+    headers = worksheet_headers[title]
+    # Unformatted values keep ratings as numbers, so the numeric pass below is
+    # normally skipped; dates and times still come back as their displayed text
+    values = get_worksheet(title).get_all_values(
+        value_render_option="UNFORMATTED_VALUE", date_time_render_option="FORMATTED_STRING"
+    )
+    # Ignore any extra columns someone adds to the sheet by hand
+    df = pd.DataFrame([row[:len(headers)] for row in values[1:]], columns=headers)
+    # Blank or text cells (gaps come back as "") leave an object column; coerce those to NaN
+    if "Rating" in df and df["Rating"].dtype == object:
+        df["Rating"] = pd.to_numeric(df["Rating"], errors="coerce")
+    # Low-cardinality columns; filters and groupbys then run on integer codes
+    for col in ("Name", "Wine"):
+        df[col] = df[col].astype("category")
+    # key=str so a hand-typed numeric name can't break the sort
+    user_list = sorted(df["Name"].unique().tolist(), key=str)
+    wine_list = sorted(df["Wine"].unique().tolist(), key=str)
+
+    # Rewrite the snapshot after every live fetch (atomically, so readers never see half a file).
+    # It's only a cold-start shortcut, so a read-only or full disk must not fail the fetch.
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp_path = _snapshot_path(title) + ".tmp"
+        pd.to_pickle((df, user_list, wine_list), tmp_path)
+        os.replace(tmp_path, _snapshot_path(title))
+    except OSError:
+        pass
+
+    return df, user_list, wine_list
+
+
+@st.cache_resource(show_spinner=False)
+def _snapshot_state():
+    # Bumped by every explicit clear; the snapshot is only served before the first one
+    return {"generation": 0}
+
+
+def invalidate_worksheets():
+    """Clears the worksheet cache after a submit or refresh and stops serving the snapshot."""
+    _snapshot_state()["generation"] += 1
+    load_worksheet.clear()
+
+
+def _initial_fetch(title):
+    generation = _snapshot_state()["generation"]
+    load_worksheet(title)
+    if _snapshot_state()["generation"] != generation:
+        # Started before an explicit clear, so what it cached may be missing new rows
+        load_worksheet.clear()
+
+
+@st.cache_resource(show_spinner=False)
+def _start_initial_fetch(title):
+    # First live read for this process; fills the load_worksheet cache when it finishes
+    thread = threading.Thread(target=_initial_fetch, args=(title,), daemon=True)
+    thread.start()
+    return thread
+
+
+def get_worksheet_data(title):
+    """Returns `load_worksheet(title)`, serving the disk snapshot while a cold start's first fetch runs."""
+    initial_fetch = _start_initial_fetch(title)
+    if initial_fetch.is_alive():
+        if _snapshot_state()["generation"] == 0:
+            try:
+                return pd.read_pickle(_snapshot_path(title))
+            except Exception:
+                # Missing, truncated or written by another pandas/numpy version
+                pass
+        # No usable snapshot, or the data was just invalidated; let the first fetch settle
+        initial_fetch.join()
+    return load_worksheet(title)
 
 
 # --------------------------
 #  3) GENERATE SUMMARY FN
 # --------------------------
+@st.cache_resource(show_spinner=False)
+def get_model():
+    # Imported lazily so reruns that never call Gemini don't pay for the SDK
+    import google.generativeai as genai
+
+    # Gemini/Generative AI Setup
+    genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+    return genai.GenerativeModel("gemini-pro")
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _generate_text(prompt):
+    # Errors propagate so failed calls are never cached
+    response = get_model().generate_content(prompt)
+    return response.text.strip() if response.text else "No response generated."
+
+
 def generate_summary(prompt):
     """Calls Google Gemini AI (old `genai` style) to generate a summary."""
     try:
-        model = genai.GenerativeModel("gemini-pro")
-        response = model.generate_content(prompt)
-        if response.text:
-            return response.text.strip()
-        return "No response generated."
+        return _generate_text(prompt)
     except Exception as e:
         return f"Could not generate a summary due to an error: {e}"
 
 
+def generate_summary_stream(prompt):
+    """Yields the summary text as Gemini streams it back. Errors propagate to the caller."""
+    response = get_model().generate_content(prompt, stream=True)
+    for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+
+def sticky_selectbox(label, options, state_key):
+    """A selectbox whose choice is kept in session_state across option-list changes.
+
+    Falls back to the first option when the saved choice isn't offered, without
+    forgetting it, so it comes back once the options include it again.
+    """
+    saved = st.session_state.get(state_key, options[0])
+    index = options.index(saved) if saved in options else 0
+    selected = st.selectbox(label, options, index=index)
+    if saved in options or selected != options[0]:
+        st.session_state[state_key] = selected
+    return selected
+
+
 # --------------------------
 #  4) STREAMLIT MAIN APP
 # --------------------------
@@ -102,14 +279,18 @@ with tab1:
         if not name.strip():
             st.warning("Please enter a valid name before submitting.")
         else:
-            # Save rating to Google Sheets
-            sheet.append_row([name.strip(), wine, rating, "Rating", ""])
+            # Save rating to Google Sheets. RAW keeps the rating a number and names/notes as plain text
+            get_worksheet("ratings").append_rows([[name.strip(), wine, rating]], value_input_option="RAW")
+
+            # Save tasting notes in a single request
+            notes = pd.Series(tasting_notes.splitlines(), dtype=object).str.strip()
+            notes = notes[notes.ne("")].tolist()
+            taste_rows = [[name.strip(), wine, taste] for taste in notes]
+            if taste_rows:
+                get_worksheet("tastes").append_rows(taste_rows, value_input_option="RAW")
 
-            # Save tasting notes
-            if tasting_notes.strip():
-                for taste in tasting_notes.splitlines():
-                    if taste.strip():
-                        sheet.append_row([name.strip(), wine, "", "Taste", taste.strip()])
+            # Make sure the next Tab 2 render pulls the new rows
+            invalidate_worksheets()
 
             st.success(f"Thank you, {name.strip()}! Your inputs for {wine} have been recorded. 🍷")
             st.rerun()
@@ -122,28 +303,27 @@ with tab2:
     st.subheader("📊 Wine Ratings & Tasting Notes Data")
 
     if st.button("🔄 Refresh Data"):
+        invalidate_worksheets()
         st.rerun()
 
-    # Load your data from Google Sheets
-    ratings_data = sheet.get_all_records()
-    df = pd.DataFrame(ratings_data)
+    # Chosen first so each rerun only loads the worksheet being viewed
+    category_filter = st.radio("Choose what to visualize:", ["Rating", "Taste"], key="category_filter")
 
-    if df.empty:
+    # Load your data from Google Sheets (cached)
+    df, user_list, wine_list = get_worksheet_data("ratings" if category_filter == "Rating" else "tastes")
+
+    # Every submission writes a rating, so an empty ratings sheet means no data at all
+    if category_filter == "Rating" and df.empty:
         st.write("No data available yet. Be the first to add your ratings!")
     else:
-        # Convert rating to numeric, just in case
-        df["Rating"] = pd.to_numeric(df["Rating"], errors="coerce")
-
+        # Selections live in session_state so they survive toggling between views
         # Select user
-        user_list = sorted(df["Name"].unique().tolist())
         user_options = ["All Users"] + user_list
-        selected_user = st.selectbox("Select a user to highlight / compare:", options=user_options)
+        selected_user = sticky_selectbox("Select a user to highlight / compare:", user_options, "selected_user")
 
         # Select wine
-        wine_options = ["All Wines"] + sorted(df["Wine"].unique().tolist())
-        selected_wine = st.selectbox("Select a wine to view:", wine_options)
-
-        category_filter = st.radio("Choose what to visualize:", ["Rating", "Taste"], key="category_filter")
+        wine_options = ["All Wines"] + wine_list
+        selected_wine = sticky_selectbox("Select a wine to view:", wine_options, "selected_wine")
 
         # ----------------------------------
         # RATINGS SECTION
@@ -151,52 +331,53 @@ with tab2:
         if category_filter == "Rating":
             st.subheader("Wine Rating Distribution")
 
-            rating_df = df[df["Category"] == "Rating"].copy()
-            if selected_wine != "All Wines":
-                rating_df = rating_df[rating_df["Wine"] == selected_wine]
+            rating_df = df if selected_wine == "All Wines" else df.loc[df["Wine"].values == selected_wine]
 
             if rating_df.empty:
                 st.write("No ratings for the selected wine.")
             else:
                 # Build histogram from 1..10
-                ratings_range = range(1, 11)
-                rating_counts = rating_df["Rating"].value_counts().reindex(ratings_range, fill_value=0)
-
-                # User ratings
-                if selected_user == "All Users":
-                    user_rating_values = set()
+                rng = np.arange(1, 11)
+                vals = rating_df["Rating"].to_numpy(dtype=float, na_value=np.nan)
+                # Only whole ratings 1..10 count; anything else hand-typed into the sheet is skipped
+                vals = vals[(vals >= 1) & (vals <= 10) & (vals == np.floor(vals))].astype(np.int64)
+                rating_counts = np.bincount(vals, minlength=11)[1:11]
+
+                # User ratings (one grouping pass, reused below)
+                by_user = rating_df.groupby("Name", sort=False, observed=True)["Rating"]
+                if selected_user in by_user.groups:
+                    user_vals = by_user.get_group(selected_user)
                 else:
-                    user_rating_values = set(rating_df.loc[rating_df["Name"] == selected_user, "Rating"].dropna())
-
-                # Color bins
-                colors = []
-                for r in ratings_range:
-                    if r in user_rating_values:
-                        colors.append("orange")
-                    else:
-                        colors.append("skyblue")
-
-                fig, ax = plt.subplots()
-                ax.bar(ratings_range, rating_counts, color=colors)
-                ax.set_xticks(list(ratings_range))
-                ax.set_title("Wine Rating Distribution")
-                ax.set_xlabel("Rating")
-                ax.set_ylabel("Count")
-
-                # Legend
-                patch_all = mpatches.Patch(color='skyblue', label='All Ratings')
-                patch_user = mpatches.Patch(color='orange', label=selected_user)
-                ax.legend(handles=[patch_all, patch_user])
-
-                st.pyplot(fig)
+                    user_vals = pd.Series(dtype=float)
+                user_rating_values = set(user_vals)
+
+                # Color bins (highlight the bins the selected user rated)
+                user_arr = np.fromiter(user_rating_values, dtype=float, count=len(user_rating_values))
+                chart_df = pd.DataFrame({
+                    "Rating": rng,
+                    "Count": rating_counts,
+                    "Group": np.where(np.isin(rng, user_arr), selected_user, "All Ratings"),
+                })
+
+                # Rendered client-side by Vega, so no server-side rasterization per rerun
+                chart = alt.Chart(chart_df, title="Wine Rating Distribution").mark_bar().encode(
+                    x=alt.X("Rating:O", axis=alt.Axis(labelAngle=0)),
+                    y=alt.Y("Count:Q"),
+                    color=alt.Color(
+                        "Group:N",
+                        scale=alt.Scale(domain=["All Ratings", selected_user], range=["skyblue", "orange"]),
+                        legend=alt.Legend(title=None),
+                    ),
+                )
+                st.altair_chart(chart, use_container_width=True)
 
                 # ------------------------------
-                # Comparison Summary for User
+                # Build AI prompts
                 # ------------------------------
+                prompt_cmp = None
                 if selected_user != "All Users":
-                    user_ratings = rating_df[rating_df["Name"] == selected_user]
-                    if not user_ratings.empty:
-                        user_mean = user_ratings["Rating"].mean()
+                    if not user_vals.empty:
+                        user_mean = user_vals.mean()
                         overall_mean = rating_df["Rating"].mean()
 
                         prompt_cmp = f"""
@@ -204,34 +385,23 @@ with tab2:
                         The overall average rating for this wine is {overall_mean:.1f}.
                         Summarize how this user's rating compares to the general trend.
                         """
-                        comparison_summary = generate_summary(prompt_cmp)
-
-                        st.subheader(f"📌 Comparison Summary for {selected_user}")
-                        st.write(comparison_summary)
-                    else:
-                        st.write(f"No personal rating data found for {selected_user} on this wine.")
 
-                # ------------------------------------------
-                # Funny “Read” Summary
-                # ------------------------------------------
+                prompt_funny = None
                 if selected_wine != "All Wines":
                     wine_ratings = rating_df["Rating"].dropna().tolist()
                     if len(wine_ratings) > 0:
                         overall_mean = np.mean(wine_ratings)
-                        if selected_user != "All Users":
-                            user_ratings = rating_df[rating_df["Name"] == selected_user]["Rating"]
-                            user_mean = user_ratings.mean() if not user_ratings.empty else overall_mean
-                        else:
-                            user_mean = overall_mean
+                        user_mean = user_vals.mean() if not user_vals.empty else overall_mean
 
-                        distribution_str = ", ".join(map(str, wine_ratings))
+                        # Fixed-size "rating:count" summary so the prompt doesn't grow with the data
+                        distribution_str = ", ".join(f"{i + 1}:{c}" for i, c in enumerate(rating_counts) if c)
 
                         # Build the prompt
                         prompt_funny = f"""
                         A user named {selected_user} rated {selected_wine} with an average score of {user_mean:.1f} out of 10.
                         The overall average rating for this wine from all users is {overall_mean:.1f} out of 10.
 
-                        Here is the full distribution of ratings for {selected_wine}: {distribution_str}.
+                        Here is the full distribution of ratings for {selected_wine}, as rating:count pairs: {distribution_str}.
                         The user you're talking to rated it {user_mean:.1f}.
 
                         Based on how they rated this wine in comparison to everyone else, write a funny "read" of this person.
@@ -242,26 +412,48 @@ with tab2:
                         Keep it to one or two paragraphs. Don't use overly flowery language or make it too dense.
                         """
 
-                        # If this is the first time for a prompt, store it in session_state
-                        if "funny_prompt" not in st.session_state:
-                            st.session_state.funny_prompt = None
-                        if "funny_response" not in st.session_state:
-                            st.session_state.funny_response = None
+                # Streamed summaries are kept per prompt so reruns don't re-stream
+                streamed = st.session_state.setdefault("streamed_summaries", {})
+
+                # The comparison summary runs in the background while the
+                # funny read streams in on the main thread
+                with ThreadPoolExecutor(max_workers=1) as ex:
+                    f_cmp = ex.submit(generate_summary, prompt_cmp) if prompt_cmp else None
 
-                        # If user changed, update stored prompt/response
-                        if (st.session_state.get("funny_prompt") != prompt_funny):
-                            st.session_state.funny_prompt = prompt_funny
-                            st.session_state.funny_response = generate_summary(prompt_funny)
+                    # ------------------------------
+                    # Comparison Summary for User
+                    # ------------------------------
+                    cmp_slot = st.container()
 
-                        # Show the summary
+                    # ------------------------------------------
+                    # Funny “Read” Summary
+                    # ------------------------------------------
+                    if prompt_funny:
                         st.subheader(f"📌 Summary of {selected_wine}")
-                        st.write(st.session_state.funny_response)
+                        if prompt_funny in streamed:
+                            st.write(streamed[prompt_funny])
+                        else:
+                            try:
+                                text = st.write_stream(generate_summary_stream(prompt_funny))
+                            except Exception as e:
+                                # Not stored, so the next rerun tries again
+                                st.write(f"Could not generate a summary due to an error: {e}")
+                            else:
+                                streamed[prompt_funny] = text
 
                         # "Regenerate" button
                         if st.button("♻️ Regenerate AI Summary"):
-                            st.session_state.funny_response = generate_summary(st.session_state.funny_prompt)
+                            streamed.pop(prompt_funny, None)
                             st.rerun()
 
+                    if selected_user != "All Users":
+                        with cmp_slot:
+                            if f_cmp is not None:
+                                st.subheader(f"📌 Comparison Summary for {selected_user}")
+                                st.write(f_cmp.result())
+                            else:
+                                st.write(f"No personal rating data found for {selected_user} on this wine.")
+
 
         # ----------------------------------
         # TASTES SECTION
@@ -269,17 +461,16 @@ with tab2:
         else:
             st.subheader("Tasting Notes Distribution")
 
-            taste_df = df[df["Category"] == "Taste"]
-            if selected_wine != "All Wines":
-                taste_df = taste_df[taste_df["Wine"] == selected_wine]
+            taste_df = df if selected_wine == "All Wines" else df.loc[df["Wine"].values == selected_wine]
 
-            if taste_df.empty:
+            if df.empty:
+                st.write("No tasting notes yet. Add some along with your next rating!")
+            elif taste_df.empty:
                 st.write("No tasting notes available for the selected wine.")
             else:
-                taste_counts = taste_df["Taste"].value_counts()
-                fig, ax = plt.subplots()
-                taste_counts.plot(kind="bar", color="orange", ax=ax)
-                ax.set_title("Tasting Notes Distribution")
-                ax.set_xlabel("Tasting Notes")
-                ax.set_ylabel("Count")
-                st.pyplot(fig)
+                taste_counts = taste_df["Taste"].value_counts().rename_axis("Taste").reset_index(name="Count")
+                chart = alt.Chart(taste_counts, title="Tasting Notes Distribution").mark_bar(color="orange").encode(
+                    x=alt.X("Taste:N", sort="-y", title="Tasting Notes"),
+                    y=alt.Y("Count:Q", title="Count"),
+                )
+                st.altair_chart(chart, use_container_width=True)